@@ -1,6 +1,14 @@
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    # 同一リクエストはHTTPレベルでキャッシュし、再実行時のAPIコールをゼロにする
+    import requests_cache
+    requests_cache.install_cache(".cache/http", backend="sqlite", expire_after=86400)
+except ImportError:
+    pass # requests_cacheが無ければ毎回ネットワークアクセス
+
 sys.path.append("../../src/fred")
 import fred
 
@@ -25,8 +33,9 @@ def main():
             df.to_csv(save_dir / f'{factor}.csv', index=False)
             
     save_dir = Path("../../data/raw/macro")
-    for factor in FRED_FACTORS:
-        _load_fred(factor, save_dir)
+    # ダウンロードはI/Oバウンドなのでスレッドで並列化
+    with ThreadPoolExecutor(max_workers=min(8, len(FRED_FACTORS))) as executor:
+        list(executor.map(lambda factor: _load_fred(factor, save_dir), FRED_FACTORS))
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,73 +1,188 @@
 import argparse
 import datetime
-import pickle
+import os
+import random
 import sys
 from pathlib import Path
 from time import sleep
 from typing import List, Literal, Union
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dateutil.relativedelta import relativedelta
+from pytrends.exceptions import ResponseError
+
+try:
+    # 同一リクエストはHTTPレベルでキャッシュし、再実行時のAPIコールをゼロにする
+    # （pytrendsはPOSTでクエリを投げるのでPOSTもキャッシュ対象にする）
+    import requests_cache
+    requests_cache.install_cache(
+        ".cache/http",
+        backend="sqlite",
+        expire_after=86400,
+        allowable_methods=("GET", "POST"),
+    )
+except ImportError:
+    pass # requests_cacheが無ければ毎回ネットワークアクセス
 
 sys.path.append("../../src/ftrends")
 import data
 
 
+def load_with_backoff(loader, *args, max_backoff:int=60, max_attempts:int=8, **kwargs):
+    """成功時は待たずに返し、429/5xxのときだけ指数バックオフで再試行する
+
+    Args:
+        loader: data.load_weekly / load_daily など
+        max_backoff (int, optional): バックオフ時間の上限（秒）. Defaults to 60.
+        max_attempts (int, optional): 最大試行回数. Defaults to 8.
+
+    Returns:
+        pd.DataFrame: loaderの戻り値
+    """
+    for attempt in range(max_attempts):
+        try:
+            return loader(*args, **kwargs)
+        except ResponseError:
+            if attempt == max_attempts - 1:
+                raise
+            wait = min(max_backoff, 2**attempt + random.uniform(0, 1))
+            print(f"rate limited, retrying in {wait:.1f}s")
+            sleep(wait)
+
+
+def load_window(
+    loader,
+    *args,
+    start_date:datetime.datetime,
+    end_date:datetime.datetime,
+    checkpoint_dir:Path=None,
+    max_backoff:int=60,
+    **kwargs
+) -> pd.DataFrame:
+    """1ウィンドウ分をロードする（チェックポイントがあればそこから読む）
+
+    チェックポイントファイルはウィンドウごとに決まった名前で保存されるので、
+    途中でクラッシュしても再実行時は取得済みウィンドウをスキップできる。
+
+    Args:
+        loader: data.load_weekly / load_daily など
+        start_date (datetime.datetime): ウィンドウ開始日
+        end_date (datetime.datetime): ウィンドウ終了日
+        checkpoint_dir (Path, optional): チェックポイント保存先. Defaults to None.
+        max_backoff (int, optional): バックオフ時間の上限（秒）. Defaults to 60.
+
+    Returns:
+        pd.DataFrame: ウィンドウのデータ
+    """
+    if checkpoint_dir is not None:
+        out = checkpoint_dir / f"chunk_{start_date:%Y%m%d}_{end_date:%Y%m%d}.parquet"
+        if out.exists():
+            return pd.read_parquet(out)
+
+    df = load_with_backoff(loader, *args, start_date=start_date, end_date=end_date, max_backoff=max_backoff, **kwargs)
+
+    if checkpoint_dir is not None:
+        checkpoint_dir.mkdir(exist_ok=True, parents=True)
+        # クラッシュで書きかけのファイルが残るとexists()が通って壊れた
+        # チェックポイントを読んでしまうので、tmpに書いてからrenameする
+        tmp = out.with_name(out.name + ".tmp")
+        df.to_parquet(tmp)
+        os.replace(tmp, out)
+
+    return df
+
+
+class ChunkParquetWriter:
+    """ウィンドウをそのままParquetへ追記するライター
+
+    全ウィンドウをメモリに貯めて最後にconcatする代わりに、届いたウィンドウを
+    chunk_id付きで逐次書き込む。メモリ使用量はウィンドウ1つ分で一定。
+    """
+    def __init__(self, out_path:Path):
+        self.out_path = out_path
+        self._writer = None
+        self._chunk_id = 0
+
+    def write(self, df:pd.DataFrame):
+        tbl = pa.Table.from_pandas(df.assign(chunk_id=self._chunk_id))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.out_path, tbl.schema, compression="snappy")
+        self._writer.write_table(tbl)
+        self._chunk_id += 1
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
 def load(
     kw_list:str,
     cat:str,
     geo:str,
     freq:Literal["M", "W", "D"]="M",
     verbose:bool=True,
-    sleep_time:int=30
-) -> Union[pd.DataFrame, List[pd.DataFrame]]:
+    max_backoff:int=60,
+    checkpoint_dir:Path=None,
+    out_path:Path=None
+) -> Union[pd.DataFrame, List[pd.DataFrame], None]:
     if freq == "M":
         df = data.load_monthly(kw_list, cat, geo)
         return df
-    
+
+    # out_path指定時はリストに貯めずストリーム書き込みする
+    writer = ChunkParquetWriter(out_path) if out_path is not None else None
+    dfs = []
+
     if freq == "W":
-        dfs = []
         today = datetime.datetime.today()
-        
+
         i = 0
         while (i >= 0):
             year=2004+4*i
             start_date = datetime.datetime(year, 1, 1)
             end_date = start_date + relativedelta(years=5, days=-1)
-            
+
             if verbose:
                 print(f"{start_date} - {end_date}")
-            
+
             if start_date > today:
                 break
-            
-            df = data.load_weekly(kw_list, cat=cat, geo=geo, start_date=start_date, end_date=end_date)
-            dfs.append(df)
-            sleep(sleep_time)
-            
+
+            df = load_window(data.load_weekly, kw_list, cat=cat, geo=geo, start_date=start_date, end_date=end_date, checkpoint_dir=checkpoint_dir, max_backoff=max_backoff)
+            if writer is not None:
+                writer.write(df)
+            else:
+                dfs.append(df)
+
             i += 1
-        return dfs
-    
+
     if freq == "D":
-        dfs = []
         today = datetime.datetime.today()
-        
+
         start_date = datetime.datetime(2004, 1, 1)
         while (True):
             end_date = start_date + relativedelta(days=269)
-            
+
             if verbose:
                 print(f"{start_date} - {end_date}")
-            
+
             if start_date > today:
                 break
-            
-            df = data.load_daily(kw_list, cat=cat, geo=geo, start_date=start_date, end_date=end_date)
-            dfs.append(df)
-            sleep(sleep_time)
-            
+
+            df = load_window(data.load_daily, kw_list, cat=cat, geo=geo, start_date=start_date, end_date=end_date, checkpoint_dir=checkpoint_dir, max_backoff=max_backoff)
+            if writer is not None:
+                writer.write(df)
+            else:
+                dfs.append(df)
+
             start_date = end_date + relativedelta(days=-30)
-        return dfs
+
+    if writer is not None:
+        writer.close()
+        return None
+    return dfs
 
 if __name__ == "__main__":
     
@@ -77,17 +192,14 @@ if __name__ == "__main__":
     parser.add_argument('--cat', default=0, type=int, help='category number')
     parser.add_argument('--geo', default="US", type=str, help='country')
     parser.add_argument('--freq', default="M", type=str, help='frequency')
-    parser.add_argument('--time', default=30, type=int, help='sleep time')
-    
+    parser.add_argument('--time', default=60, type=int, help='max backoff time')
+
     # args
     args = parser.parse_args()
-    kw_list, cat, geo, freq, sleep_time = vars(args).values()
+    kw_list, cat, geo, freq, max_backoff = vars(args).values()
     kw_list.sort() # sort keywords
-    
-    # load data-frame(s)
-    df = load(kw_list, cat, geo, freq=freq, sleep_time=sleep_time)
-    
-    # save
+
+    # save location (also used as checkpoint dir for windowed pulls)
     if freq == "M":
         save_dir_parent = Path("../../data/raw/google/monthly")
     if freq == "W":
@@ -98,13 +210,17 @@ if __name__ == "__main__":
 
     save_dir = save_dir_parent / dir_name
     file_name = f"svi_cat{cat}"
-    
+
     if not save_dir.exists():
         save_dir.mkdir(exist_ok=True, parents=True)
-    
+
+    # load data-frame(s)（週次・日次はload()内でParquetへストリーム書き込み）
+    # チェックポイントはcat・geoごとに分ける（同じキーワードでも別条件の
+    # 取得結果を再利用してはいけない）
+    checkpoint_dir = None if freq == "M" else save_dir / f"cat{cat}_{geo}"
+    out_path = None if freq == "M" else save_dir / f"{file_name}.parquet"
+    df = load(kw_list, cat, geo, freq=freq, max_backoff=max_backoff, checkpoint_dir=checkpoint_dir, out_path=out_path)
+
+    # save
     if freq == "M":
-        df.to_csv(save_dir / f"{file_name}.csv")
-    
-    else:
-        with (save_dir / f"{file_name}.pkl").open(mode="wb") as f:
-            pickle.dump(df, f)
\ No newline at end of file
+        df.to_csv(save_dir / f"{file_name}.csv")
\ No newline at end of file
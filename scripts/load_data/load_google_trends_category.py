@@ -1,71 +1,96 @@
 import argparse
 import datetime
-import pickle
 import sys
 from pathlib import Path
-from time import sleep
 from typing import List, Literal, Union
 
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 
+try:
+    # 同一リクエストはHTTPレベルでキャッシュし、再実行時のAPIコールをゼロにする
+    # （pytrendsはPOSTでクエリを投げるのでPOSTもキャッシュ対象にする）
+    import requests_cache
+    requests_cache.install_cache(
+        ".cache/http",
+        backend="sqlite",
+        expire_after=86400,
+        allowable_methods=("GET", "POST"),
+    )
+except ImportError:
+    pass # requests_cacheが無ければ毎回ネットワークアクセス
+
 sys.path.append("../../src/ftrends")
 import data
 
+from load_google_trends import ChunkParquetWriter, load_window
+
 
 def load(
     cat:str,
     geo:str,
     freq:Literal["M", "W", "D"]="M",
     verbose:bool=True,
-) -> Union[pd.DataFrame, List[pd.DataFrame]]:
+    max_backoff:int=60,
+    checkpoint_dir:Path=None,
+    out_path:Path=None,
+) -> Union[pd.DataFrame, List[pd.DataFrame], None]:
     if freq == "M":
         df = data.load_category_monthly(cat, geo)
         return df
-    
+
+    # out_path指定時はリストに貯めずストリーム書き込みする
+    writer = ChunkParquetWriter(out_path) if out_path is not None else None
+    dfs = []
+
     if freq == "W":
-        dfs = []
         today = datetime.datetime.today()
-        
+
         i = 0
         while (i >= 0):
             year=2004+4*i
             start_date = datetime.datetime(year, 1, 1)
             end_date = start_date + relativedelta(years=5, days=-1)
-            
+
             if verbose:
                 print(f"{start_date} - {end_date}")
-            
+
             if start_date > today:
                 break
-            
-            df = data.load_category_weekly(cat, geo=geo, start_date=start_date, end_date=end_date)
-            dfs.append(df)
-            sleep(30)
-            
+
+            df = load_window(data.load_category_weekly, cat, geo=geo, start_date=start_date, end_date=end_date, checkpoint_dir=checkpoint_dir, max_backoff=max_backoff)
+            if writer is not None:
+                writer.write(df)
+            else:
+                dfs.append(df)
+
             i += 1
-        return dfs
-    
+
     if freq == "D":
-        dfs = []
         today = datetime.datetime.today()
-        
+
         start_date = datetime.datetime(2004, 1, 1)
         while (True):
             end_date = start_date + relativedelta(days=269)
-            
+
             if verbose:
                 print(f"{start_date} - {end_date}")
-            
+
             if start_date > today:
                 break
-            
-            df = data.load_category_daily(cat, geo=geo, start_date=start_date, end_date=end_date)
-            dfs.append(df)
-            sleep(30)
-            
+
+            df = load_window(data.load_category_daily, cat, geo=geo, start_date=start_date, end_date=end_date, checkpoint_dir=checkpoint_dir, max_backoff=max_backoff)
+            if writer is not None:
+                writer.write(df)
+            else:
+                dfs.append(df)
+
             start_date = end_date + relativedelta(days=-30)
-        return dfs
+
+    if writer is not None:
+        writer.close()
+        return None
+    return dfs
 
 if __name__ == "__main__":
     
@@ -79,23 +104,23 @@ if __name__ == "__main__":
     args = parser.parse_args()
     cat, geo, freq = vars(args).values()
     
-    # load data-frame(s)
-    df = load(cat, geo, freq=freq)
-    
-    # save
+    # save location (also used as checkpoint dir for windowed pulls)
     if freq == "M":
         save_dir = Path("../../data/raw/google_category/monthly")
     if freq == "W":
         save_dir = Path("../../data/raw/google_category/weekly")
     if freq == "D":
         save_dir = Path("../../data/raw/google_category/daily")
-    
+
     if not save_dir.exists():
         save_dir.mkdir(exist_ok=True, parents=True)
-    
+
+    # load data-frame(s)（週次・日次はload()内でParquetへストリーム書き込み）
+    # チェックポイントはcat・geoごとに分ける（別条件の取得結果を再利用しない）
+    checkpoint_dir = None if freq == "M" else save_dir / f"cat{cat}_{geo}"
+    out_path = None if freq == "M" else save_dir / f"cat{cat}.parquet"
+    df = load(cat, geo, freq=freq, checkpoint_dir=checkpoint_dir, out_path=out_path)
+
+    # save
     if freq == "M":
-        df.to_csv(save_dir / f"cat{cat}.csv")
-    
-    else:
-        with (save_dir / f"cat{cat}.pkl").open(mode="wb") as f:
-            pickle.dump(df, f)
\ No newline at end of file
+        df.to_csv(save_dir / f"cat{cat}.csv")
\ No newline at end of file
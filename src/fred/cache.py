@@ -0,0 +1,67 @@
+import datetime
+import hashlib
+import os
+import time
+from functools import wraps
+from pathlib import Path
+
+import pandas as pd
+
+CACHE_DIR = Path(".cache/fred")
+
+_TTL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _parse_ttl(ttl:str) -> int:
+    """TTL文字列（例："1d"）を秒数に変換
+
+    Args:
+        ttl (str): 数値＋単位（s/m/h/d）の文字列
+
+    Returns:
+        int: 秒数
+    """
+    value, unit = ttl[:-1], ttl[-1]
+    if unit not in _TTL_UNITS:
+        error = f"unknown TTL unit: {unit}. Use one of {list(_TTL_UNITS)}."
+        raise ValueError(error)
+    return int(value) * _TTL_UNITS[unit]
+
+
+def disk_cache(ttl:str="1d", cache_dir:Path=CACHE_DIR):
+    """DataFrameを返す関数にParquetのディスクキャッシュを付けるデコレータ
+
+    キャッシュキーは引数＋当日日付のハッシュなので、同じ引数でも日付が
+    変われば再取得される。
+
+    Args:
+        ttl (str, optional): キャッシュの有効期限. Defaults to "1d".
+        cache_dir (Path, optional): キャッシュの保存先. Defaults to CACHE_DIR.
+    """
+    ttl_seconds = _parse_ttl(ttl)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            raw = "|".join(
+                [func.__name__]
+                + [str(a) for a in args]
+                + [f"{k}={v}" for k, v in sorted(kwargs.items())]
+                + [str(datetime.date.today())]
+            )
+            key = hashlib.sha1(raw.encode()).hexdigest()
+            path = cache_dir / f"{key}.parquet"
+
+            if path.exists() and (time.time() - path.stat().st_mtime) <= ttl_seconds:
+                return pd.read_parquet(path)
+
+            df = func(*args, **kwargs)
+
+            cache_dir.mkdir(exist_ok=True, parents=True)
+            tmp = path.with_name(f"{key}.parquet.tmp")
+            df.to_parquet(tmp) # 書き込み途中のファイルを読まないよう、tmpに書いてからrename
+            os.replace(tmp, path)
+
+            return df
+        return wrapper
+    return decorator
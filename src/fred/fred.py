@@ -1,13 +1,18 @@
-import numpy as np
-from full_fred.fred import Fred
-
-
-def get_data(path_key:str, factor:str):
-    fred = Fred(path_key)
-    df = fred.get_series_df(factor)
-    df = df.loc[:, ["date", "value"]]
-    df["value"].replace(".", np.nan, inplace=True)
-    df.dropna(how="any", inplace=True)
-    df["value"] = df["value"].astype(float)
-    df = df.rename(columns={"value":factor})
-    return df
\ No newline at end of file
+import pandas as pd
+from full_fred.fred import Fred
+
+from cache import disk_cache
+
+
+@disk_cache(ttl="1d")
+def _fetch_series(path_key:str, factor:str):
+    fred = Fred(path_key)
+    return fred.get_series_df(factor)
+
+
+def get_data(path_key:str, factor:str):
+    df = _fetch_series(path_key, factor) # APIコールはキャッシュミス時のみ
+    df = df.loc[:, ["date", "value"]].rename(columns={"value":factor})
+    df[factor] = pd.to_numeric(df[factor], errors="coerce") # "."などの欠損表現は1パスでNaNになる
+    df = df.dropna(subset=[factor])
+    return df
@@ -1,34 +1,31 @@
 import datetime
-from typing import List
+from typing import Dict, List, Tuple
 
+import numpy as np
 import pandas as pd
-import statsmodels.api as sm
+from scipy import stats
 
 
 def convert_index_type_to_datetime(df:pd.DataFrame):
-    if type(df.index) != pd.DatetimeIndex:
+    # isinstanceならDatetimeIndexのサブクラスも変換せずに済む
+    if not isinstance(df.index, pd.DatetimeIndex):
         df.index = pd.to_datetime(df.index)
 
-def knitRGB(
+def _knit_core(
     df1:pd.DataFrame,
     df2:pd.DataFrame,
     direction:str="forward",
     min_num_duplicated_samples:int=30,
     max_num_zeros:int=10,
     reg_const_significance:float=0.05,
-) -> pd.DataFrame:
-    """二つのデータセットをつなぎ合わせる
+):
+    """つなぎ合わせの回帰・予測部分（延長された予測部分のみ返す）
 
     Args:
-        df1 (pd.DataFrame): SVIデータ、indexは日付、カラムはSVIの一列のみ
-        df2 (pd.DataFrame): SVIデータ、indexは日付、カラムはSVIの一列のみ（データの開始日付がdf1のものよりも後でないとエラーがはかれる）
-        direction (str, optional): つなげる方向. Defaults to "forward".
-        min_num_duplicated_samples (int, optional): 重複しなければならないデータ数の下限値. Defaults to 30.
-        max_num_zeros (int, optional): 重複データにゼロが含まれていい回数. Defaults to 10.
-        reg_const_significance (float, optional): OLSした際の、interceptionの有意水準. Defaults to 0.05.
+        knitRGBと同じ。
 
     Returns:
-        pd.DataFrame: つなぎ合わせたデータ
+        pd.DataFrame: 重複しない領域の予測データ
     """
     # convert to pd.pd.DatetimeIndex
     for df in [df1, df2]:
@@ -58,59 +55,122 @@ def knitRGB(
         )
         raise AssertionError(error)
     
+    # 重複部分はラベル参照（.loc）を繰り返さず、位置を一度引いてndarrayで持つ
+    vals1 = df1.values
+    vals2 = df2.values
+    y_overlap = vals1[df1.index.get_indexer(idx_intersection), 0].astype(np.float64)
+    x_overlap = vals2[df2.index.get_indexer(idx_intersection), 0].astype(np.float64)
+
     # check the number of zeros
-    _df1 = df1.loc[idx_intersection, :]
-    _df2 = df2.loc[idx_intersection, :]
-    num_zero1 = (_df1 == 0).sum().values[0]
-    num_zero2 = (_df2 == 0).sum().values[0]
+    num_zero1 = np.count_nonzero(y_overlap == 0)
+    num_zero2 = np.count_nonzero(x_overlap == 0)
     try:
         assert (num_zero1 <= max_num_zeros) and (num_zero2 <= max_num_zeros)
     except:
         error = "There exists a lot of zeros."
         raise AssertionError(error)
 
-    def _regression(_df1:pd.DataFrame, _df2:pd.DataFrame):
+    def _regression(y:np.ndarray, x:np.ndarray):
+        # 単回帰なのでstatsmodelsを通さずlstsqで直接解く
+        # （summaryや共分散行列の計算が不要なぶん軽い）
+        n = y.size
+
         add_const = True
 
         # 1st regression with intercept
-        _df2 = sm.add_constant(_df2)
-        res = sm.OLS(_df1, _df2).fit()
-        const_pvalue = res.pvalues["const"]
-        r2 = res.rsquared
+        X = np.column_stack([np.ones(n), x])
+        beta, _, _, _ = np.linalg.lstsq(X, y, rcond=None)
+        resid = y - X @ beta
+        ss_res = resid @ resid
+
+        # interceptのp値だけ手計算（t検定）
+        sigma2 = ss_res / (n - 2)
+        se_const = np.sqrt(sigma2 * np.linalg.inv(X.T @ X)[0, 0])
+        const_pvalue = 2 * stats.t.sf(abs(beta[0] / se_const), n - 2)
 
         # 2nd regression without intercept（interceptionの有意性がない場合）
         if const_pvalue >= reg_const_significance:
             add_const = False
-            _df2.drop(columns=["const"], inplace=True)
-            res = sm.OLS(_df1, _df2).fit()
-            r2 = res.rsquared
-        
-        return res, r2, add_const
+            slope = (x @ y) / (x @ x)
+            beta = np.array([0.0, slope])
+            resid = y - slope * x
+            ss_res = resid @ resid
+            ss_tot = y @ y # no-constantモデルはuncentered TSS（statsmodelsと同じ定義）
+        else:
+            ss_tot = ((y - y.mean())**2).sum()
+
+        r2 = 1 - ss_res / ss_tot
+
+        return beta, r2, add_const
+
+    if direction == "forward":
+        beta, r2, add_const = _regression(y_overlap, x_overlap)
+        # 単調なDatetimeIndex同士なのでisinのハッシュ化よりdifferenceのマージが速い
+        idx_pred = df2.index.difference(idx_intersection)
+        x_pred = vals2[df2.index.get_indexer(idx_pred), 0].astype(np.float64, copy=False)
+        pred = beta[0] + beta[1] * x_pred # no-constantならbeta[0]=0
+        df_pred = pd.DataFrame(pred, index=idx_pred, columns=[df1.columns[0]])
+
+    if direction == "backward":
+        beta, r2, add_const = _regression(x_overlap, y_overlap)
+        idx_pred = df1.index.difference(idx_intersection)
+        x_pred = vals1[df1.index.get_indexer(idx_pred), 0].astype(np.float64, copy=False)
+        pred = beta[0] + beta[1] * x_pred
+        df_pred = pd.DataFrame(pred, index=idx_pred, columns=[df2.columns[0]])
+
+    return df_pred, r2, add_const
+
+def knitRGB(
+    df1:pd.DataFrame,
+    df2:pd.DataFrame,
+    direction:str="forward",
+    min_num_duplicated_samples:int=30,
+    max_num_zeros:int=10,
+    reg_const_significance:float=0.05,
+) -> pd.DataFrame:
+    """二つのデータセットをつなぎ合わせる
+
+    Args:
+        df1 (pd.DataFrame): SVIデータ、indexは日付、カラムはSVIの一列のみ
+        df2 (pd.DataFrame): SVIデータ、indexは日付、カラムはSVIの一列のみ（データの開始日付がdf1のものよりも後でないとエラーがはかれる）
+        direction (str, optional): つなげる方向. Defaults to "forward".
+        min_num_duplicated_samples (int, optional): 重複しなければならないデータ数の下限値. Defaults to 30.
+        max_num_zeros (int, optional): 重複データにゼロが含まれていい回数. Defaults to 10.
+        reg_const_significance (float, optional): OLSした際の、interceptionの有意水準. Defaults to 0.05.
+
+    Returns:
+        pd.DataFrame: つなぎ合わせたデータ
+    """
+    df_pred, r2, add_const = _knit_core(
+        df1,
+        df2,
+        direction=direction,
+        min_num_duplicated_samples=min_num_duplicated_samples,
+        max_num_zeros=max_num_zeros,
+        reg_const_significance=reg_const_significance
+    )
 
     if direction == "forward":
-        res, r2, add_const = _regression(_df1, _df2)
-        X_pred = df2[~df2.index.isin(idx_intersection)]
-        if add_const:
-            X_pred = sm.add_constant(X_pred)
-        df_pred = res.predict(X_pred).to_frame(name=_df1.columns[0])
         df_rbc = pd.concat([df1,df_pred]).sort_index()
 
     if direction == "backward":
-        res, r2, add_const = _regression(_df2, _df1)
-        X_pred = df1[~df1.index.isin(idx_intersection)]
-        if add_const:
-            X_pred = sm.add_constant(X_pred)
-        df_pred = res.predict(X_pred).to_frame(name=_df2.columns[0])
         df_rbc = pd.concat([df2,df_pred]).sort_index()
 
     return df_rbc, r2, add_const
 
 class RBC:
     def __init__(
-        self, 
-        list_df=List[pd.DataFrame]
+        self,
+        list_df:List[pd.DataFrame],
+        copy:bool=False
     ):
-        self.list_df = list_df.copy()
+        # knitはself.list_dfを変更しないので、デフォルトではリストを
+        # コピーしない（呼び出し側がリストを使い回すときだけcopy=True）
+        self.list_df = list(list_df) if copy else list_df
+        # indexの変換はここで一度だけやっておく（knitのループ内で
+        # 変換済みのindexを毎回チェックし直さなくて済む）
+        for df in self.list_df:
+            convert_index_type_to_datetime(df)
 
     def knit(
         self,
@@ -135,21 +195,29 @@ class RBC:
 
         summary = {}
 
+        # つなぎ合わせたデータを毎回concatすると反復ごとに全体をコピーし直す
+        # （O(N^2)）。ピースをリストに貯めて最後に一度だけconcatする。
+        # 回帰に必要なのは直近チャンクとの重複部分だけなので、末尾（backwardは
+        # 先頭）2ピースだけを渡せば十分。
+
         if direction == "forward":
-            df_rbc = self.list_df[0].copy() 
+            pieces = [self.list_df[0].copy()]
             for i, df_exog in enumerate(self.list_df[1:]):
-                
+
+                tail = pd.concat(pieces[-2:]) if len(pieces) > 1 else pieces[0]
+
                 start_date = df_exog.index.min()
-                end_date = df_rbc.index.max()
+                end_date = tail.index.max()
 
-                df_rbc, r2, add_const = knitRGB(
-                    df_rbc,
+                df_pred, r2, add_const = _knit_core(
+                    tail,
                     df_exog,
                     direction=direction,
                     min_num_duplicated_samples=min_num_duplicated_samples,
                     max_num_zeros=max_num_zeros,
                     reg_const_significance=reg_const_significance
                 )
+                pieces.append(df_pred)
 
                 summary[i] = {
                     "start date": start_date,
@@ -157,22 +225,27 @@ class RBC:
                     "r2": r2,
                     "intercept":add_const
                 }
-            
+
+            df_rbc = pd.concat(pieces).sort_index()
+
         if direction == "backward":
-            df_rbc = self.list_df[-1].copy()
+            pieces = [self.list_df[-1].copy()]
             for i, df_exog in enumerate(reversed(self.list_df[:-1])):
 
-                start_date = df_rbc.index.min()
+                head = pd.concat(pieces[:2]) if len(pieces) > 1 else pieces[0]
+
+                start_date = head.index.min()
                 end_date = df_exog.index.max()
 
-                df_rbc, r2, add_const = knitRGB(
+                df_pred, r2, add_const = _knit_core(
                     df_exog,
-                    df_rbc,
+                    head,
                     direction=direction,
                     min_num_duplicated_samples=min_num_duplicated_samples,
                     max_num_zeros=max_num_zeros,
                     reg_const_significance=reg_const_significance
                 )
+                pieces.insert(0, df_pred)
 
                 summary[i] = {
                     "start date": start_date,
@@ -180,11 +253,41 @@ class RBC:
                     "r2": r2,
                     "intercept":add_const
                 }
-        
+
+            df_rbc = pd.concat(pieces).sort_index()
+
         # （為念）回帰の結果を表示
         self.summary = summary.copy()
 
         if normalize:
-            df_rbc = df_rbc / df_rbc.max() * 100
+            df_rbc = df_rbc / df_rbc.values.max() * 100
 
         return  df_rbc
+
+def knit_many(
+    list_of_list_df:List[List[pd.DataFrame]],
+    n_jobs:int=-1,
+    **knit_kwargs
+) -> List[Tuple[pd.DataFrame, Dict]]:
+    """複数キーワードぶんのつなぎ合わせを並列実行する
+
+    RBC(list_df).knit()はキーワードごとに独立なCPUバウンド処理なので、
+    プロセス並列でコア数ぶんスケールする。summaryも一緒に返すので
+    プロセス境界を越えても回帰結果が失われない。
+
+    Args:
+        list_of_list_df (List[List[pd.DataFrame]]): RBCに渡すDataFrameリストのリスト
+        n_jobs (int, optional): 並列数（-1で全コア）. Defaults to -1.
+        **knit_kwargs: RBC.knitにそのまま渡す引数
+
+    Returns:
+        List[Tuple[pd.DataFrame, Dict]]: (つなぎ合わせたデータ, summary)のリスト
+    """
+    from joblib import Parallel, delayed
+
+    def _knit_one(list_df):
+        rbc = RBC(list_df)
+        df_rbc = rbc.knit(**knit_kwargs)
+        return df_rbc, rbc.summary
+
+    return Parallel(n_jobs=n_jobs)(delayed(_knit_one)(list_df) for list_df in list_of_list_df)
@@ -1,217 +1,315 @@
-import datetime
-from typing import List
-
-import pandas as pd
-from dateutil.relativedelta import relativedelta
-from pytrends.request import TrendReq
-
-
-def load_monthly(
-    kw_list:List[str],
-    cat:int=0,
-    geo:str='US',
-    group:str='',
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """月次データの取得
-
-    Args:
-        kw_list (List[str]): キーワードリスト。
-        cat (int, optional): カテゴリ番号. Defaults to 0.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 月次データ
-    """
-    pytrends = TrendReq(hl='en-US', tz=360, retries=10, backoff_factor=0.1) # Googleに接続
-    pytrends.build_payload(kw_list, cat=cat, timeframe='all', geo=geo, gprop=group) # Googleにリクエスト
-    
-    df = pytrends.interest_over_time()
-    if exclude_partial:
-        df = df[df["isPartial"] == False] # Partialデータはとらない
-    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
-
-    return df
-
-def load_weekly(
-    kw_list:List[str],
-    cat:int=0,
-    geo:str='US',
-    group:str='',
-    start_date:datetime.datetime=None,
-    end_date:datetime.datetime=None,
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """週次データの取得（データ期間が271日以上であることが必須）
-
-    Args:
-        kw_list (List[str]): キーワードリスト。
-        cat (int, optional): カテゴリ番号. Defaults to 0.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
-        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 週次データ
-    """
-    if (start_date == None) and (end_date == None):
-        end_date = datetime.datetime.now()
-        start_date = end_date + relativedelta(years=-5, days=1)
-    if (start_date != None) and (end_date == None):
-        end_date = start_date + relativedelta(years=5, days=-1)
-    if (start_date == None) and (end_date != None):
-        start_date = end_date + relativedelta(years=-5, days=1)
-
-    d = (end_date - start_date).days + 1
-    try:
-        assert d > 270
-    except:
-        error = f"time interval must be longer than 270 days. Now, {d}days."
-        raise AssertionError(error)
-
-    timeframe = "{} {}".format(
-        start_date.strftime(format="%Y-%m-%d"),
-        end_date.strftime(format="%Y-%m-%d")
-    )
-
-    pytrends = TrendReq(hl='en-US', tz=360, retries=10, backoff_factor=0.1) # Googleに接続
-    pytrends.build_payload(kw_list, cat=cat, timeframe=timeframe, geo=geo, gprop=group) # Googleにリクエスト
-    df = pytrends.interest_over_time()
-    if exclude_partial:
-        df = df[df["isPartial"] == False] # Partialデータはとらない
-    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
-
-    return df
-
-def load_daily(
-    kw_list:List[str],
-    cat:int=0,
-    geo:str='US',
-    group:str='',
-    start_date:datetime.datetime=None,
-    end_date:datetime.datetime=None,
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """日次データの取得（データ期間が270日以下であることが必須）
-
-    Args:
-        kw_list (List[str]): キーワードリスト。
-        cat (int, optional): カテゴリ番号. Defaults to 0.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
-        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 日次データ
-    """
-    if (start_date == None) and (end_date == None):
-        end_date = datetime.datetime.now()
-        start_date = end_date + relativedelta(days=-269)
-    if (start_date != None) and (end_date == None):
-        end_date = start_date + relativedelta(days=269)
-    if (start_date == None) and (end_date != None):
-        start_date = end_date + relativedelta(days=-269)
-
-    d = (end_date - start_date).days + 1
-    try:
-        assert d <= 270
-    except:
-        error = f"time interval must be 270 days or shorter. Now, {d}days."
-        raise AssertionError(error)
-
-    timeframe = "{} {}".format(
-        start_date.strftime(format="%Y-%m-%d"),
-        end_date.strftime(format="%Y-%m-%d")
-    )
-
-    pytrends = TrendReq(hl='en-US', tz=360, retries=10, backoff_factor=0.1) # Googleに接続
-    pytrends.build_payload(kw_list, cat=cat, timeframe=timeframe, geo=geo, gprop=group) # Googleにリクエスト
-    df = pytrends.interest_over_time()
-    if exclude_partial:
-        df = df[df["isPartial"] == False] # Partialデータはとらない
-    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
-    
-    return df
-
-def load_category_monthly(
-    cat:int,
-    geo:str='US',
-    group:str='',
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """月次カテゴリデータの取得
-
-    Args:
-        cat (int, optional): カテゴリ番号.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 月次データ
-    """
-    kw_list = [""]
-    df = load_monthly(kw_list, cat=cat, geo=geo, group=group, exclude_partial=exclude_partial)
-    df.rename(columns={"":cat}, inplace=True)
-
-    return df
-
-def load_category_weekly(
-    cat:int,
-    geo:str='US',
-    group:str='',
-    start_date:datetime.datetime=None,
-    end_date:datetime.datetime=None,
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """週次データの取得（データ期間が271日以上であることが必須）
-
-    Args:
-        cat (int, optional): カテゴリ番号.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
-        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 週次データ
-    """
-    kw_list = [""]
-    df = load_weekly(kw_list, cat=cat, geo=geo, group=group, start_date=start_date, end_date=end_date, exclude_partial=exclude_partial)
-    df.rename(columns={"":cat}, inplace=True)
-
-    return df
-
-def load_category_daily(
-    cat:int,
-    geo:str='US',
-    group:str='',
-    start_date:datetime.datetime=None,
-    end_date:datetime.datetime=None,
-    exclude_partial:bool=True,
-) -> pd.DataFrame:
-    """日次データの取得（データ期間が270日以下であることが必須）
-
-    Args:
-        cat (int, optional): カテゴリ番号.
-        geo (str, optional): 地域. Defaults to 'US'.
-        group (str, optional): グループ. Defaults to ''.
-        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
-        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
-        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
-
-    Returns:
-        pd.DataFrame: 日次データ
-    """
-    kw_list = [""]
-    df = load_daily(kw_list, cat=cat, geo=geo, group=group, start_date=start_date, end_date=end_date, exclude_partial=exclude_partial)
-    df.rename(columns={"":cat}, inplace=True)
-    
+import datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from pytrends.request import TrendReq
+
+try:
+    # レスポンスJSONのデコードをorjsonに差し替える（ウィンドウごとに
+    # 大きめのペイロードをパースするので数倍効く）。dumpsはorjsonだと
+    # bytesが返ってpytrendsのパラメータ組み立てが壊れるので標準のまま。
+    import json as _stdlib_json
+    import types as _types
+
+    import orjson
+    import pytrends.request as _pytrends_request
+    _pytrends_request.json = _types.SimpleNamespace(
+        loads=orjson.loads,
+        dumps=_stdlib_json.dumps,
+    )
+except ImportError:
+    pass # orjsonが無ければ標準のjsonのまま
+
+_pytrends = None
+
+def _get_trendreq() -> TrendReq:
+    """モジュール共通のTrendReqを返す（初回のみ生成）
+
+    呼び出しごとに生成するとTLSハンドシェイク・クッキー取得を毎回払うので、
+    接続プールを持つセッションを使い回す。
+
+    Returns:
+        TrendReq: 共有セッション
+    """
+    global _pytrends
+    if _pytrends is None:
+        _pytrends = TrendReq(hl='en-US', tz=360, retries=10, backoff_factor=0.1) # Googleに接続
+    return _pytrends
+
+
+def load_monthly(
+    kw_list:List[str],
+    cat:int=0,
+    geo:str='US',
+    group:str='',
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """月次データの取得
+
+    Args:
+        kw_list (List[str]): キーワードリスト。
+        cat (int, optional): カテゴリ番号. Defaults to 0.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 月次データ
+    """
+    pytrends = _get_trendreq() # 共有セッションを再利用
+    pytrends.build_payload(kw_list, cat=cat, timeframe='all', geo=geo, gprop=group) # Googleにリクエスト
+    
+    df = pytrends.interest_over_time()
+    if exclude_partial:
+        df = df[df["isPartial"] == False] # Partialデータはとらない
+    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
+
+    return df
+
+def load_monthly_batched(
+    kw_lists:List[List[str]],
+    cat:int=0,
+    geo:str='US',
+    group:str='',
+    exclude_partial:bool=True,
+) -> List[pd.DataFrame]:
+    """複数のキーワードリストをまとめて月次データを取得
+
+    Google Trendsは1リクエスト5キーワードまでなので、リストを5キーワード
+    以内のバッチに詰め合わせてリクエスト数をK回からceil(K/5)回程度に減らす。
+    Trendsはリクエスト単位で正規化されるため、2バッチ目以降には先頭キーワードを
+    アンカーとして同梱し、アンカーのスケール比でバッチ間を揃える。
+
+    Args:
+        kw_lists (List[List[str]]): キーワードリストのリスト。2バッチ目以降は
+            アンカーが1枠使うため、各リストは4キーワード以下でないといけない。
+        cat (int, optional): カテゴリ番号. Defaults to 0.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        List[pd.DataFrame]: kw_listsと同順の月次データ
+    """
+    anchor = kw_lists[0][0]
+
+    # 5キーワード以内のバッチに詰め合わせる（2バッチ目以降はアンカー分で4枠）
+    batches = [] # 各要素は [(元リストのindex, キーワードリスト), ...]
+    current, size = [], 0
+    for idx, kw_list in enumerate(kw_lists):
+        # まず溢れを確定させてから、実際に入るバッチの枠数で検証する
+        # （溢れて2バッチ目以降に回ったリストは5枠ではなく4枠しか使えない）
+        capacity = 5 if len(batches) == 0 else 4
+        if current and size + len(kw_list) > capacity:
+            batches.append(current)
+            current, size = [], 0
+            capacity = 4
+        if len(kw_list) > capacity:
+            error = f"each keyword list must have {capacity} keywords or fewer, got {len(kw_list)}."
+            raise ValueError(error)
+        current.append((idx, kw_list))
+        size += len(kw_list)
+    if current:
+        batches.append(current)
+
+    results = {}
+    anchor_base = None
+    for i, members in enumerate(batches):
+        flat = [kw for _, kw_list in members for kw in kw_list]
+        payload = flat if i == 0 else [anchor] + flat
+        df = load_monthly(payload, cat=cat, geo=geo, group=group, exclude_partial=exclude_partial)
+
+        if i == 0:
+            anchor_base = df[anchor].copy()
+            scale = 1.0
+        else:
+            # アンカーのスケール比でバッチ間正規化
+            scale = (anchor_base / df[anchor].replace(0, np.nan)).mean()
+
+        for idx, kw_list in members:
+            results[idx] = df[kw_list] if i == 0 else df[kw_list] * scale
+
+    return [results[idx] for idx in range(len(kw_lists))]
+
+def load_weekly(
+    kw_list:List[str],
+    cat:int=0,
+    geo:str='US',
+    group:str='',
+    start_date:datetime.datetime=None,
+    end_date:datetime.datetime=None,
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """週次データの取得（データ期間が271日以上であることが必須）
+
+    Args:
+        kw_list (List[str]): キーワードリスト。
+        cat (int, optional): カテゴリ番号. Defaults to 0.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
+        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 週次データ
+    """
+    if (start_date == None) and (end_date == None):
+        end_date = datetime.datetime.now()
+        start_date = end_date + relativedelta(years=-5, days=1)
+    if (start_date != None) and (end_date == None):
+        end_date = start_date + relativedelta(years=5, days=-1)
+    if (start_date == None) and (end_date != None):
+        start_date = end_date + relativedelta(years=-5, days=1)
+
+    d = (end_date - start_date).days + 1
+    try:
+        assert d > 270
+    except:
+        error = f"time interval must be longer than 270 days. Now, {d}days."
+        raise AssertionError(error)
+
+    timeframe = "{} {}".format(
+        start_date.strftime(format="%Y-%m-%d"),
+        end_date.strftime(format="%Y-%m-%d")
+    )
+
+    pytrends = _get_trendreq() # 共有セッションを再利用
+    pytrends.build_payload(kw_list, cat=cat, timeframe=timeframe, geo=geo, gprop=group) # Googleにリクエスト
+    df = pytrends.interest_over_time()
+    if exclude_partial:
+        df = df[df["isPartial"] == False] # Partialデータはとらない
+    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
+
+    return df
+
+def load_daily(
+    kw_list:List[str],
+    cat:int=0,
+    geo:str='US',
+    group:str='',
+    start_date:datetime.datetime=None,
+    end_date:datetime.datetime=None,
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """日次データの取得（データ期間が270日以下であることが必須）
+
+    Args:
+        kw_list (List[str]): キーワードリスト。
+        cat (int, optional): カテゴリ番号. Defaults to 0.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
+        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 日次データ
+    """
+    if (start_date == None) and (end_date == None):
+        end_date = datetime.datetime.now()
+        start_date = end_date + relativedelta(days=-269)
+    if (start_date != None) and (end_date == None):
+        end_date = start_date + relativedelta(days=269)
+    if (start_date == None) and (end_date != None):
+        start_date = end_date + relativedelta(days=-269)
+
+    d = (end_date - start_date).days + 1
+    try:
+        assert d <= 270
+    except:
+        error = f"time interval must be 270 days or shorter. Now, {d}days."
+        raise AssertionError(error)
+
+    timeframe = "{} {}".format(
+        start_date.strftime(format="%Y-%m-%d"),
+        end_date.strftime(format="%Y-%m-%d")
+    )
+
+    pytrends = _get_trendreq() # 共有セッションを再利用
+    pytrends.build_payload(kw_list, cat=cat, timeframe=timeframe, geo=geo, gprop=group) # Googleにリクエスト
+    df = pytrends.interest_over_time()
+    if exclude_partial:
+        df = df[df["isPartial"] == False] # Partialデータはとらない
+    df = df.iloc[:, 0:len(kw_list)] # 最終列に'isPartial'という余計なカラムができるので削除
+    
+    return df
+
+def load_category_monthly(
+    cat:int,
+    geo:str='US',
+    group:str='',
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """月次カテゴリデータの取得
+
+    Args:
+        cat (int, optional): カテゴリ番号.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 月次データ
+    """
+    kw_list = [""]
+    df = load_monthly(kw_list, cat=cat, geo=geo, group=group, exclude_partial=exclude_partial)
+    df.rename(columns={"":cat}, inplace=True)
+
+    return df
+
+def load_category_weekly(
+    cat:int,
+    geo:str='US',
+    group:str='',
+    start_date:datetime.datetime=None,
+    end_date:datetime.datetime=None,
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """週次データの取得（データ期間が271日以上であることが必須）
+
+    Args:
+        cat (int, optional): カテゴリ番号.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
+        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 週次データ
+    """
+    kw_list = [""]
+    df = load_weekly(kw_list, cat=cat, geo=geo, group=group, start_date=start_date, end_date=end_date, exclude_partial=exclude_partial)
+    df.rename(columns={"":cat}, inplace=True)
+
+    return df
+
+def load_category_daily(
+    cat:int,
+    geo:str='US',
+    group:str='',
+    start_date:datetime.datetime=None,
+    end_date:datetime.datetime=None,
+    exclude_partial:bool=True,
+) -> pd.DataFrame:
+    """日次データの取得（データ期間が270日以下であることが必須）
+
+    Args:
+        cat (int, optional): カテゴリ番号.
+        geo (str, optional): 地域. Defaults to 'US'.
+        group (str, optional): グループ. Defaults to ''.
+        start_date (datetime.datetime, optional): データ取得開始日. Defaults to None.
+        end_date (datetime.datetime, optional): データ取得終了日. Defaults to None.
+        exclude_partial: (bool, optional): 不完全データ除外するか. Defaults to True.
+
+    Returns:
+        pd.DataFrame: 日次データ
+    """
+    kw_list = [""]
+    df = load_daily(kw_list, cat=cat, geo=geo, group=group, start_date=start_date, end_date=end_date, exclude_partial=exclude_partial)
+    df.rename(columns={"":cat}, inplace=True)
+    
     return df
\ No newline at end of file
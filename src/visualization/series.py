@@ -15,16 +15,20 @@ def series_plot(
     show_rangeobjects:bool=True,
     **layout_kwargs,
 ):
+    # resolve per-column labels / axes once (no dict lookups inside the loop)
+    names = [label_names.get(col, col) for col in df.columns] if label_names is not None else list(df.columns) # change label name
+    yaxes = [col_to_yaxis.get(col, "y") for col in df.columns] if col_to_yaxis else ["y"] * len(df.columns)
+    x = df.index.values
+    values = df.values # column slices below are views, not new Series
     # make traces
     traces = [] # trace list
-    for i, col in enumerate(df.columns):
-        name = label_names[col] if label_names is not None else col # change label name
+    for i in range(len(names)):
         trace = go.Scatter(
-            x = df.index,
-            y = df[col],
-            name = name,
+            x = x,
+            y = values[:, i],
+            name = names[i],
             marker_color = colors[i % len(colors)],
-            yaxis = col_to_yaxis[col] if col_to_yaxis else "y"
+            yaxis = yaxes[i]
         )
         traces.append(trace)
     # make layout